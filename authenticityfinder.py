@@ -1,6 +1,237 @@
 import requests
 import urllib.parse
 import argparse
+import bisect
+import contextlib
+import functools
+import itertools
+import math
+import shelve
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from orjson import loads as json_loads  # Faster parser when available
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    from requests_cache import CachedSession  # Optional on-disk response cache
+except ImportError:
+    CachedSession = None
+
+REQUEST_TIMEOUT = (3.05, 10)  # (connect, read) timeout in seconds
+CACHE_EXPIRE_AFTER = 86400  # Seconds cached API responses stay valid
+MAX_WORKERS = 10  # Concurrent Places requests
+MAX_QPS = 10  # API requests sent per second, kept under the Places QPS limit
+EARTH_RADIUS_M = 6371000  # Mean Earth radius in meters
+GRID_PRECISION = 3  # Decimal places waypoints are rounded to for caching (~110 m)
+POI_FIELDS = ('name', 'place_id')  # Place fields kept from each Places result
+MAX_PAGES = 2  # Result pages (20 places each) fetched per waypoint
+PAGE_TOKEN_DELAY = 2  # Seconds before Google accepts a next_page_token
+
+
+def is_cacheable(response):
+    """
+    Checks whether an API response is a successful result that may be cached.
+
+    Google reports errors such as REQUEST_DENIED or OVER_QUERY_LIMIT with HTTP 200,
+    so the JSON status is checked rather than the HTTP status code alone.
+
+    Args:
+        response (requests.Response): The API response.
+
+    Returns:
+        bool: True if the response status is OK or ZERO_RESULTS.
+    """
+    try:
+        return json_loads(response.content).get('status') in ('OK', 'ZERO_RESULTS')
+    except ValueError:
+        return False
+
+
+class RateLimiter:
+    """
+    This class spaces out requests shared across threads to stay under a requests-per-second limit.
+
+    Attributes:
+        interval (float): The minimum time, in seconds, between the start of two requests.
+    """
+    __slots__ = ('interval', '_next_slot', '_lock')
+
+    def __init__(self, qps):
+        """
+        Initializes the RateLimiter class with the allowed request rate.
+
+        Args:
+            qps (float): The maximum number of requests started per second.
+        """
+        self.interval = 1 / qps
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Blocks until the calling thread may start its request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    This adapter waits on a RateLimiter before each request it sends over the network.
+
+    Responses served by requests-cache never reach the adapter, so cache hits are not paced.
+
+    Attributes:
+        rate_limiter (RateLimiter): Paces the requests sent through this adapter.
+    """
+    def __init__(self, rate_limiter, **kwargs):
+        """
+        Initializes the RateLimitedAdapter class with the limiter to wait on.
+
+        Args:
+            rate_limiter (RateLimiter): Paces the requests sent through this adapter.
+            **kwargs: Passed on to HTTPAdapter.
+        """
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        """
+        Waits for a rate limiter slot, then sends the request.
+        """
+        self.rate_limiter.wait()
+        return super().send(request, **kwargs)
+
+
+def create_session(pool_maxsize=MAX_WORKERS, cache_name=None, qps=MAX_QPS):
+    """
+    Creates an HTTP session shared by all Google API calls.
+
+    Reusing one session keeps connections to the API hosts alive between calls,
+    so each request does not pay for a new TCP and TLS handshake. Requests sent
+    over the network are paced to qps per second across all threads.
+
+    When cache_name is given and requests-cache is installed, GET responses are
+    also cached on disk, so repeated runs skip the network for the same queries.
+
+    Args:
+        pool_maxsize (int): The maximum number of pooled connections per host.
+        cache_name (str, optional): The SQLite file to cache responses in.
+        qps (float, optional): The maximum number of requests sent per second.
+
+    Returns:
+        requests.Session: A session with connection pooling and retries configured.
+    """
+    if cache_name and CachedSession is not None:
+        # The API key is left out of cache keys and redacted from stored responses,
+        # so only successful results are stored; a denial must not outlive a fixed key
+        session = CachedSession(cache_name, backend='sqlite', expire_after=CACHE_EXPIRE_AFTER,
+                                allowable_methods=('GET',), ignored_parameters=['key'],
+                                filter_fn=is_cacheable)
+    else:
+        if cache_name:
+            print("requests-cache is not installed; responses will not be cached.")
+        session = requests.Session()
+    # Return the last response once retries run out, so callers can report its status code
+    retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+    adapter = RateLimitedAdapter(RateLimiter(qps), pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retries)
+    session.mount("https://", adapter)
+    return session
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """
+    Calculates the great-circle distance between two points.
+
+    Args:
+        lat1 (float): The latitude of the first point, in degrees.
+        lng1 (float): The longitude of the first point, in degrees.
+        lat2 (float): The latitude of the second point, in degrees.
+        lng2 (float): The longitude of the second point, in degrees.
+
+    Returns:
+        float: The distance between the points, in meters.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def decode_polyline(encoded):
+    """
+    Decodes a Google encoded polyline into its points.
+
+    Args:
+        encoded (str): The encoded polyline, e.g. a route's overview_polyline.
+
+    Returns:
+        list: The (latitude, longitude) points of the polyline.
+    """
+    points = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):  # Latitude delta, then longitude delta
+            result = shift = 0
+            while True:
+                chunk = ord(encoded[index]) - 63
+                index += 1
+                result |= (chunk & 0x1f) << shift
+                shift += 5
+                if chunk < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / 1e5, lng / 1e5))
+    return points
+
+
+def segment_lengths(points):
+    """
+    Calculates the great-circle length of each segment between consecutive points.
+
+    Args:
+        points (list): The (latitude, longitude) points, in degrees.
+
+    Returns:
+        list: The length of each segment, in meters.
+    """
+    return [haversine(lat1, lng1, lat2, lng2) for (lat1, lng1), (lat2, lng2) in zip(points, points[1:])]
+
+
+def dedup_waypoints(waypoints, min_sep_m):
+    """
+    Drops waypoints that are too close to an earlier waypoint.
+
+    Waypoints are accepted greedily in route order; a waypoint closer than
+    min_sep_m to any accepted waypoint is dropped, since its search circle is
+    already covered.
+
+    Args:
+        waypoints (list): The (latitude, longitude) waypoints along the route.
+        min_sep_m (float): The minimum separation between kept waypoints, in meters.
+
+    Returns:
+        list: The waypoints that are at least min_sep_m apart.
+    """
+    accepted = []
+    for lat, lng in waypoints:
+        if all(haversine(lat, lng, alat, alng) >= min_sep_m for alat, alng in accepted):
+            accepted.append((lat, lng))
+    return accepted
 
 class UserInputs:
     """
@@ -12,6 +243,8 @@ class UserInputs:
         keyword (str): Keyword for the search, input by the user.
         distoffpath (float): Maximum distance user is willing to deviate from the path, in miles.
     """
+    __slots__ = ('startloc', 'endloc', 'keyword', 'distoffpath')
+
     def __init__(self):
         """
         Initializes the UserInputs class by prompting the user for input and setting the attributes.  
@@ -69,8 +302,12 @@ class Route:
         Args:
             startloc (str): The starting location for the route.
             endloc (str): The ending location for the route.
+            session (requests.Session, optional): The HTTP session used for API calls.
+            cache (dict-like, optional): A persistent mapping (e.g. a shelf) of previously fetched routes.
     """
-    def __init__(self, startloc, endloc):
+    __slots__ = ('startloc', 'endloc', 'waypoints', 'session', 'cache')
+
+    def __init__(self, startloc, endloc, session=None, cache=None):
         """
         Fetches the route data from the Google Maps API.
 
@@ -83,24 +320,43 @@ class Route:
         self.startloc = startloc
         self.endloc = endloc
         self.waypoints = []
+        self.session = session or create_session()
+        self.cache = cache
 
     def fetch_route(self, api_key):  # Changed to instance method, removed start, end as they are instance attributes
         """
         Fetches the route data from the Google Maps API.
 
+        When a route cache is set, a route fetched for the same start and end within
+        CACHE_EXPIRE_AFTER seconds is returned without calling the API. The cache is
+        keyed on the locations only, so the API key is never stored.
+
         Args:
             api_key (str): The API key for accessing the Google Maps API.
 
         Returns:
             dict: The route data in JSON format.
         """
-    
+        # Normalize case and whitespace so trivially different inputs share an entry
+        cache_key = "|".join(" ".join(loc.lower().split()) for loc in (self.startloc, self.endloc))
+        if self.cache is not None and cache_key in self.cache:
+            fetched_at, route = self.cache[cache_key]
+            if time.time() - fetched_at < CACHE_EXPIRE_AFTER:
+                return route
+
         encoded_start = urllib.parse.quote(self.startloc)
         encoded_end = urllib.parse.quote(self.endloc)
         url = f"https://maps.googleapis.com/maps/api/directions/json?origin={encoded_start}&destination={encoded_end}&key={api_key}"
-        response = requests.get(url)
+        try:
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            print(f"Error fetching route: {e}")
+            return None
         if response.status_code == 200:
-            return response.json()
+            route = json_loads(response.content)
+            if self.cache is not None and route.get('status') == 'OK':
+                self.cache[cache_key] = (time.time(), route)
+            return route
         else:
             print(f"Error fetching route: {response.status_code}")
             return None
@@ -109,6 +365,10 @@ class Route:
         """
         Calculates waypoints along the route at specified intervals.
 
+        The waypoints are sampled by arc length along the route's overview polyline,
+        whose points are much denser than the route's steps, so waypoints land close
+        to each interval boundary.
+
         Args:
             route (dict): The route data.
             interval_miles (float): The interval, in miles, at which to calculate waypoints.
@@ -117,17 +377,15 @@ class Route:
             self.waypoints: Populates this list with the calculated waypoints.
         """
 
-        self.waypoints = []  # Reset waypoints
-        accumulated_distance = 0  # Distance accumulated over steps
-
-        for leg in route['routes'][0]['legs']:
-            for step in leg['steps']:
-                step_distance = step['distance']['value'] / 1609.34  # Convert meters to miles
-                accumulated_distance += step_distance
+        points = decode_polyline(route['routes'][0]['overview_polyline']['points'])
+        # Cumulative distance, in miles, at each polyline point
+        cumulative = list(itertools.accumulate((length / 1609.34 for length in segment_lengths(points)), initial=0))
+        total = cumulative[-1]
 
-                if accumulated_distance >= interval_miles:
-                    self.waypoints.append((step['end_location']['lat'], step['end_location']['lng']))
-                    accumulated_distance -= interval_miles  # Decrement for next waypoint
+        # The first point reaching each interval boundary; a segment spanning several boundaries is used once
+        boundaries = (k * interval_miles for k in range(1, int(total // interval_miles) + 1))
+        indices = dict.fromkeys(bisect.bisect_left(cumulative, boundary) for boundary in boundaries)
+        self.waypoints = [points[i] for i in indices]
 
 class POIloc:
     """
@@ -138,9 +396,13 @@ class POIloc:
         api_key (str): The API key for accessing the Google Maps API.
         keyword (str): The search keyword for the points of interest.
         distoffpath (float): The maximum distance, in meters, from the path to search for POIs.
+        session (requests.Session): The HTTP session used for API calls.
+        max_workers (int): The number of Places requests issued concurrently.
     """
-    
-    def __init__(self, waypoints, api_key, keyword, distoffpath):
+    __slots__ = ('waypoints', 'api_key', 'keyword', 'distoffpath', 'session', 'max_workers',
+                 '_search_cached', '_query_suffix')
+
+    def __init__(self, waypoints, api_key, keyword, distoffpath, session=None, max_workers=MAX_WORKERS):
         """
         Initializes the POIloc class with waypoints, API key, search keyword, and distance off path.
 
@@ -149,36 +411,100 @@ class POIloc:
             api_key (str): The API key for accessing the Google Maps API.
             keyword (str): The search keyword for the points of interest.
             distoffpath (float): The maximum distance, in meters, from the path to search for POIs.
+            session (requests.Session, optional): The HTTP session used for API calls.
+            max_workers (int, optional): The number of Places requests issued concurrently.
         """
         self.waypoints = waypoints
         self.api_key = api_key
         self.keyword = keyword
         self.distoffpath = distoffpath  # distance in meters
+        self.session = session or create_session(pool_maxsize=max_workers)
+        self.max_workers = max_workers
+        self._search_cached = functools.lru_cache(maxsize=1024)(self._fetch_nearby)
+        # The query parameters other than location are fixed, so encode them once
+        self._query_suffix = "&" + urllib.parse.urlencode({
+            'radius': self.distoffpath,
+            'keyword': self.keyword,
+            'key': self.api_key
+        })
 
     def search_nearby(self, location):
         """
         Searches for nearby points of interest based on a location.
 
+        The location is rounded to a grid of about 110 m, so waypoints that fall
+        in the same cell share a single Places request.
+
         Args:
             location (tuple): The latitude and longitude of the location to search near.
 
         Returns:
             list: A list of points of interest near the specified location.
         """
-        
+        return self._search_cached(round(location[0], GRID_PRECISION), round(location[1], GRID_PRECISION))
+
+    def _fetch_nearby(self, lat, lng):
+        """
+        Fetches nearby points of interest for a location from the Google Places API.
+
+        Follows next_page_token for up to MAX_PAGES pages, so dense keywords are not
+        cut off at the first 20 results.
+
+        Args:
+            lat (float): The latitude of the location to search near.
+            lng (float): The longitude of the location to search near.
+
+        Returns:
+            list: A list of points of interest near the specified location.
+        """
         base_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-        params = {
-            'location': f"{location[0]},{location[1]}",
-            'radius': self.distoffpath,
-            'keyword': self.keyword,
-            'key': self.api_key
-        }
-        response = requests.get(base_url, params=params)
-        if response.status_code == 200:
-            return response.json()['results']
-        else:
-            print(f"Error fetching POIs: {response.status_code}")
-            return []
+        url = f"{base_url}?location={lat:.6f},{lng:.6f}{self._query_suffix}"
+        params = None
+        results = []
+        for page in range(MAX_PAGES):
+            try:
+                response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                print(f"Error fetching POIs: {e}")
+                break
+            if response.status_code != 200:
+                print(f"Error fetching POIs: {response.status_code}")
+                break
+
+            data = json_loads(response.content)
+            # Keep only the fields we use so cached results stay small
+            results.extend({field: place[field] for field in POI_FIELDS if field in place}
+                           for place in data.get('results', []))
+
+            token = data.get('next_page_token')
+            if not token or page == MAX_PAGES - 1:
+                break
+            if not getattr(response, 'from_cache', False):
+                time.sleep(PAGE_TOKEN_DELAY)  # The token is rejected until shortly after it is issued
+            url, params = base_url, {'pagetoken': token, 'key': self.api_key}
+        return results
+
+    def iter_pois(self):
+        """
+        Yields points of interest near all the waypoints as their searches complete.
+
+        The waypoint searches are independent, so they are issued concurrently
+        from a thread pool; results keep the order of the waypoints. Places found
+        from more than one waypoint are only yielded once.
+
+        Yields:
+            dict: A point of interest near the waypoints.
+        """
+        seen_place_ids = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for results in executor.map(self.search_nearby, self.waypoints):
+                for poi in results:
+                    place_id = poi.get('place_id')
+                    if place_id in seen_place_ids:
+                        continue
+                    if place_id:
+                        seen_place_ids.add(place_id)
+                    yield poi
 
     def search_waypoints(self):
         """
@@ -187,15 +513,92 @@ class POIloc:
         Returns:
             list: A list of points of interest near the waypoints.
         """
+        return list(self.iter_pois())
+
+    def search_along_route(self, encoded_polyline):
+        """
+        Searches for points of interest along a whole route with one Places API (New) text search.
+
+        Unlike search_waypoints, this covers the route corridor in a single request;
+        Google ranks the places by detour from the route, so distoffpath is not applied.
+
+        Args:
+            encoded_polyline (str): The route's encoded overview polyline.
+
+        Returns:
+            list: A list of points of interest along the route.
+        """
+        url = "https://places.googleapis.com/v1/places:searchText"
+        headers = {
+            'X-Goog-Api-Key': self.api_key,
+            'X-Goog-FieldMask': 'places.id,places.displayName,nextPageToken'
+        }
+        body = {
+            'textQuery': self.keyword,
+            'searchAlongRouteParameters': {'polyline': {'encodedPolyline': encoded_polyline}}
+        }
+
         poi_results = []
-        for waypoint in self.waypoints:
-            results = self.search_nearby(waypoint)
-            poi_results.extend(results)
+        seen_place_ids = set()
+        for _ in range(MAX_PAGES):
+            try:
+                response = self.session.post(url, json=body, headers=headers, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                print(f"Error fetching POIs: {e}")
+                break
+            if response.status_code != 200:
+                print(f"Error fetching POIs: {response.status_code}")
+                break
+
+            data = json_loads(response.content)
+            for place in data.get('places', []):
+                if place['id'] in seen_place_ids:
+                    continue
+                seen_place_ids.add(place['id'])
+                # Match the fields returned by search_nearby
+                poi_results.append({'name': place.get('displayName', {}).get('text'), 'place_id': place['id']})
+
+            if 'nextPageToken' not in data:
+                break
+            body['pageToken'] = data['nextPageToken']
         return poi_results
         
 
+def positive_int(value):
+    """
+    Parses a command-line value that must be a positive integer.
+
+    Args:
+        value (str): The value given on the command line.
+
+    Returns:
+        int: The parsed value.
+    """
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+
+def positive_float(value):
+    """
+    Parses a command-line value that must be a positive number.
+
+    Args:
+        value (str): The value given on the command line.
+
+    Returns:
+        float: The parsed value.
+    """
+    number = float(value)
+    if not number > 0:  # Also rejects NaN
+        raise argparse.ArgumentTypeError(f"must be a positive number, got {value}")
+    return number
+
+
 # Your existing class definitions for UserInputs, Route, and POIloc go here.
-def main(api_key, startloc=None, endloc=None, keyword=None, distoffpath=None):
+def main(api_key, startloc=None, endloc=None, keyword=None, distoffpath=None, workers=MAX_WORKERS, along_route=False, cache=None,
+         qps=MAX_QPS):
     """
     The main function of the application, orchestrating the flow from user input to displaying POIs.
 
@@ -205,6 +608,12 @@ def main(api_key, startloc=None, endloc=None, keyword=None, distoffpath=None):
         endloc (str, optional): The ending location for the route.
         keyword (str, optional): The search keyword for the points of interest.
         distoffpath (float, optional): The maximum distance, in miles, from the path to search for POIs.
+        workers (int, optional): The number of Places requests issued concurrently.
+        along_route (bool, optional): Search the whole route with one Places API (New) request
+            instead of one request per waypoint.
+        cache (str, optional): The file to cache API responses in between runs; fetched routes
+            are also kept in a shelf next to it.
+        qps (float, optional): The maximum number of API requests sent per second.
 
     Side Effects:
         - Prompts
@@ -219,24 +628,33 @@ def main(api_key, startloc=None, endloc=None, keyword=None, distoffpath=None):
     else:
         distoffpath = float(distoffpath)
 
+    # One session is shared by the Directions and Places calls so connections are reused
+    session = create_session(pool_maxsize=workers, cache_name=cache, qps=qps)
+
     # Instantiate Route and call its methods
-    route = Route(startloc, endloc)  # Create an instance of Route
-    route_data = route.fetch_route(api_key)  # Call instance method
+    with (shelve.open(f"{cache}.routes") if cache else contextlib.nullcontext()) as route_cache:
+        route = Route(startloc, endloc, session, route_cache)  # Create an instance of Route
+        route_data = route.fetch_route(api_key)  # Call instance method
 
     if not route_data:
         print("Failed to fetch route data.")
         return
 
-    # Calculate waypoints using the route data
-    route.calculate_waypoints(route_data, interval_miles=25)  # Call instance method
+    if along_route:
+        # A single corridor search replaces the per-waypoint queries
+        poi_lookup = POIloc([], api_key, keyword, distoffpath * 1609.34, session, workers)
+        poi_results = poi_lookup.search_along_route(route_data['routes'][0]['overview_polyline']['points'])
+    else:
+        # Calculate waypoints using the route data
+        route.calculate_waypoints(route_data, interval_miles=25)  # Call instance method
+        route.waypoints = dedup_waypoints(route.waypoints, min_sep_m=distoffpath * 1609.34 * 0.5)
 
-    # Create an instance of POIloc using the waypoints from the route instance
-    poi_lookup = POIloc(route.waypoints, api_key, keyword, distoffpath * 1609.34)  # Convert miles to meters
-    poi_results = poi_lookup.search_waypoints()
+        # Create an instance of POIloc using the waypoints from the route instance
+        poi_lookup = POIloc(route.waypoints, api_key, keyword, distoffpath * 1609.34, session, workers)  # Convert miles to meters
+        poi_results = poi_lookup.iter_pois()  # Stream results so early waypoints print first
 
-    # Output the results
-    for poi in poi_results:
-        print(poi.get('name', 'No name available'))  # Safely get the name or a default value
+    # Output the results through the buffered stream rather than one print() call per line
+    sys.stdout.writelines(f"{poi.get('name') or 'No name available'}\n" for poi in poi_results)
 
 
 if __name__ == "__main__":
@@ -246,7 +664,12 @@ if __name__ == "__main__":
     parser.add_argument("--end", help="Ending location")
     parser.add_argument("--keyword", help="Search keyword (e.g., 'antique stores', 'national parks')")
     parser.add_argument("--distance", help="How far off the path are you willing to go?")
+    parser.add_argument("--workers", type=positive_int, default=MAX_WORKERS, help="Number of concurrent Places requests")
+    parser.add_argument("--qps", type=positive_float, default=MAX_QPS, help="Maximum API requests sent per second")
+    parser.add_argument("--along-route", action="store_true",
+                        help="Search the whole route in one request (requires Places API (New))")
+    parser.add_argument("--cache", help="File to cache routes and API responses in (responses require requests-cache)")
 
     args = parser.parse_args()
     
-    main(args.apikey, args.start, args.end, args.keyword, args.distance)
+    main(args.apikey, args.start, args.end, args.keyword, args.distance, args.workers, args.along_route, args.cache, args.qps)